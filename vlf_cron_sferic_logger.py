@@ -1,8 +1,9 @@
 import os
-import queue
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
 
-import numpy as np
 import sounddevice as sd
 import soundfile as sf
 
@@ -59,39 +60,54 @@ def record_stream_to_file(filename: str, duration_seconds: int, fs: int = SAMPLE
     Record audio using a streaming callback and write directly to disk to avoid
     large memory allocations. Stops after duration_seconds.
     """
-    q: queue.Queue[np.ndarray] = queue.Queue()
+    # Single producer (audio callback) / single consumer (writer loop).
+    # deque.append/popleft are atomic under the GIL, so no lock is needed
+    # in the realtime callback; the event only wakes the writer.
+    blocks: deque = deque()
+    ready = threading.Event()
 
     def callback(indata, frames, time_info, status):
         if status:
             print(f"Stream status: {status}")
         # Copy to avoid referencing underlying buffer
-        q.put(indata.copy())
+        blocks.append(indata.copy())
+        ready.set()
 
     frames_to_write = duration_seconds * fs
     written = 0
 
+    # Record into a .part file and rename it once complete, so an interrupted
+    # segment (e.g. power loss) is never mistaken for a finished recording
+    part_filename = filename + ".part"
+
     with sf.SoundFile(
-        filename,
+        part_filename,
         mode="w",
         samplerate=fs,
         channels=channels,
+        format="WAV",
         subtype="PCM_16",
     ) as file, sd.InputStream(
         samplerate=fs,
         channels=channels,
-        dtype="float32",
+        dtype="int16",  # Matches the PCM_16 file so samples are written without conversion
         callback=callback,
     ):
         print(f"Recording to {filename} for {duration_seconds} seconds...")
         while written < frames_to_write:
-            data = q.get()
+            if not blocks:
+                ready.wait(0.05)
+                ready.clear()
+                continue
+            data = blocks.popleft()
             # Ensure we don't exceed the intended duration
             remaining = frames_to_write - written
             if len(data) > remaining:
                 data = data[:remaining]
             file.write(data)
             written += len(data)
-        print(f"Saved: {filename}")
+    os.replace(part_filename, filename)
+    print(f"Saved: {filename}")
 
 
 def run_night_recording():
@@ -100,13 +116,11 @@ def run_night_recording():
     if now < start_dt:
         wait = (start_dt - now).total_seconds()
         print(f"Waiting until window start at {start_dt} (~{int(wait)}s)...")
-        # Busy-wait with sleep intervals to keep simple and portable
-        import time as _time
-        while True:
-            now = datetime.now()
-            if now >= start_dt:
-                break
-            _time.sleep(min(60, max(1, int((start_dt - now).total_seconds()))))
+        # Sleep straight to the start; chunks of at most an hour re-check the
+        # clock so an NTP or manual time change can't push us far off schedule
+        while wait > 0:
+            time.sleep(min(wait, 3600))
+            wait = (start_dt - datetime.now()).total_seconds()
 
     end_dt = window_end_for(start_dt)
     print(f"Recording window: {start_dt} -> {end_dt} ({TOTAL_HOURS} hours)")
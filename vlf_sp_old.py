@@ -1,16 +1,16 @@
 
 import argparse
-import matplotlib
-
-matplotlib.use("Agg")  # Avoid GUI backends on headless Raspberry Pi
-
-import matplotlib.pyplot as plt
 import numpy as np
 import soundfile as sf
 from scipy.signal import spectrogram
 from config import SPEC_MAX_FREQ
 
 def plot_spectrogram(filename, output="spectrogram.png", max_freq=SPEC_MAX_FREQ):
+    import matplotlib
+
+    matplotlib.use("Agg")  # Avoid GUI backends on headless Raspberry Pi
+    import matplotlib.pyplot as plt
+
     # Load audio file into float32 to halve memory footprint
     data, samplerate = sf.read(filename, dtype="float32", always_2d=True)
     data = data[:, 0]  # Use first channel if stereo
@@ -28,10 +28,20 @@ def plot_spectrogram(filename, output="spectrogram.png", max_freq=SPEC_MAX_FREQ)
 
     # Convert to log scale using float32 to keep memory usage low
     Sxx = np.maximum(Sxx.astype(np.float32, copy=False), 1e-12)
-    Sxx_db = 20 * np.log10(Sxx)
+    np.log10(Sxx, out=Sxx)
+    np.multiply(Sxx, 20.0, out=Sxx)
+    Sxx_db = Sxx
 
     plt.figure(figsize=(10, 5))
-    plt.pcolormesh(t, f, Sxx_db, shading="gouraud", cmap="inferno")
+    # Bins are evenly spaced, so imshow is exact and avoids building a quadmesh
+    plt.imshow(
+        Sxx_db,
+        origin="lower",
+        aspect="auto",
+        extent=[t[0], t[-1], f[0], f[-1]],
+        interpolation="nearest",
+        cmap="inferno",
+    )
     plt.ylabel("Frequency [Hz]")
     plt.xlabel("Time [s]")
     plt.ylim([0, max_freq])
@@ -2,14 +2,10 @@
 import argparse
 import os
 import tempfile
-import matplotlib
-
-matplotlib.use("Agg")  # Avoid GUI backends on headless Raspberry Pi
-
-import matplotlib.pyplot as plt
 import numpy as np
 import soundfile as sf
-from scipy.signal import spectrogram
+from scipy.fft import rfft, set_workers
+from scipy.signal import get_window
 from config import (
     SPEC_MAX_FREQ,
     SPEC_NPERSEG,
@@ -21,34 +17,132 @@ from config import (
     SPEC_COLORMAP,
 )
 
-
-def _compute_spectrogram_chunk(x, samplerate, nperseg, noverlap):
-    # Compute magnitude spectrogram for a chunk (no detrend, Hann window default)
-    f, t, Sxx = spectrogram(
-        x,
-        fs=samplerate,
-        nperseg=nperseg,
-        noverlap=noverlap,
-        detrend=False,
-        scaling="spectrum",
-        mode="magnitude",
-    )
-    return f, t, Sxx
+try:
+    # Optional dependency; fuses the dB conversion into a single parallel pass
+    from numba import njit, prange  # type: ignore
+except ImportError:
+    njit = None
+
+# Output figure geometry; also sets how far the image is pre-decimated
+_FIGSIZE = (10, 5)
+_DPI = 150
+
+# Spectrograms smaller than this stay in RAM instead of a disk-backed memmap
+_IN_MEMORY_MAX_BYTES = 256 << 20
+
+# Matplotlib figure, axes and image reused across renders (built on first use)
+_FIG = None
+_AX = None
+_IM = None
+
+# Normalised Hann windows keyed by nperseg, shared by every call in the process
+_WINDOWS = {}
+
+
+def _hann_window(nperseg):
+    # Normalised by its sum so magnitudes match scaling="spectrum"
+    window = _WINDOWS.get(nperseg)
+    if window is None:
+        window = get_window("hann", nperseg).astype(np.float32)
+        window /= window.sum()
+        _WINDOWS[nperseg] = window
+    return window
+
+
+def _compute_spectrogram_chunk(x, frames, window, hop):
+    # Frame the chunk without copying, apply the window into the preallocated
+    # frames buffer and run one batched real FFT over all frames (no detrend).
+    nperseg = window.shape[0]
+    view = np.lib.stride_tricks.sliding_window_view(x, nperseg)[::hop]
+    buf = frames[: view.shape[0]]
+    np.multiply(view, window, out=buf)
+    return rfft(buf, axis=1, overwrite_x=True)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cplx_to_db(re, im, out, floor):
+        # Power -> clipped dB, written straight into out (freq x time)
+        n_freq, n_frames = out.shape
+        for k in prange(n_freq):
+            for j in range(n_frames):
+                m2 = re[j, k] * re[j, k] + im[j, k] * im[j, k]
+                out[k, j] = 10.0 * np.log10(max(m2, floor))
+else:
+    def _cplx_to_db(re, im, out, floor):
+        # NumPy fallback: same result with in-place temporaries
+        m2 = re[: out.shape[1]] * re[: out.shape[1]]
+        m2 += im[: out.shape[1]] * im[: out.shape[1]]
+        np.maximum(m2, floor, out=m2)
+        np.log10(m2, out=m2)
+        m2 *= 10.0
+        out[...] = m2.T
+
+
+def _plot_figure(img_data, output, fmt, extent, max_freq, colormap, vmin, vmax):
+    global _FIG, _AX, _IM
+    # Imported lazily so importing this module stays cheap for the recorder
+    import matplotlib
+
+    matplotlib.use("Agg")  # Avoid GUI backends on headless Raspberry Pi
+    import matplotlib.pyplot as plt
+
+    if _FIG is None:
+        # Plot using imshow to avoid generating a giant quadmesh in memory
+        _FIG, _AX = plt.subplots(figsize=_FIGSIZE)
+        _IM = _AX.imshow(
+            img_data,
+            origin="lower",
+            aspect="auto",
+            extent=extent,
+            interpolation="nearest",
+            cmap=colormap,
+            vmin=vmin,
+            vmax=vmax,
+        )
+        _AX.set_ylabel("Frequency [Hz]")
+        _AX.set_xlabel("Time [s]")
+        cbar = _FIG.colorbar(_IM, ax=_AX)
+        cbar.set_label("Magnitude [dB]")
+        _AX.set_title("Spectrogram")
+    else:
+        # Later renders only swap the data; the colorbar follows the clim
+        _IM.set_data(img_data)
+        _IM.set_extent(extent)
+        _IM.set_cmap(colormap)
+        _IM.set_clim(vmin, vmax)
+    _AX.set_xlim(extent[0], extent[1])
+    _AX.set_ylim([0, max_freq])
+    _FIG.tight_layout()
+    _FIG.savefig(output, format=fmt, dpi=_DPI)
+
+
+def _save_image(img_data, output, fmt, colormap, vmin, vmax):
+    # Apply the colormap as a 256-entry LUT and write the pixels with Pillow,
+    # skipping matplotlib's figure machinery when no axes are needed
+    import matplotlib
+    from PIL import Image
+
+    u8 = np.clip((img_data - vmin) * (255.0 / (vmax - vmin)), 0, 255).astype(np.uint8)
+    lut = (matplotlib.colormaps[colormap](np.arange(256))[:, :3] * 255).astype(np.uint8)
+    # Flip rows so low frequencies end up at the bottom, as with origin="lower"
+    pil_format = Image.registered_extensions().get(f".{fmt}", "PNG")
+    Image.fromarray(lut[u8[::-1]]).save(output, format=pil_format, optimize=False, compress_level=1)
 
 
 def plot_spectrogram(filename, output="spectrogram.png", max_freq=SPEC_MAX_FREQ,
                      nperseg=SPEC_NPERSEG, noverlap=SPEC_NOVERLAP, block_seconds=SPEC_BLOCK_SECONDS,
                      plow=SPEC_PLOW, phigh=SPEC_PHIGH, db_range=SPEC_DB_RANGE, colormap=SPEC_COLORMAP,
-                     start_sec=None, duration_sec=None, last_minutes=None):
+                     start_sec=None, duration_sec=None, last_minutes=None, axes=True):
     """
     Streamed, low‑memory spectrogram.
 
     - Reads the WAV file in small blocks (no full-file load)
-    - Computes STFT per block with proper overlap carry
-    - Stores dB values in a disk-backed memmap to keep RAM flat
-    - Renders final image using the memmap to avoid large arrays in memory
+    - Computes STFT per block, with soundfile supplying the frame overlap
+    - Stores dB values in RAM when small, else in a disk-backed memmap to keep RAM flat
+    - Renders final image from views of that array to avoid large copies
+    - With axes=False, writes only the colour-mapped image via Pillow
     """
-
     info = sf.info(filename)
     samplerate = info.samplerate
     channels = info.channels
@@ -86,135 +180,126 @@ def plot_spectrogram(filename, output="spectrogram.png", max_freq=SPEC_MAX_FREQ,
 
     n_freq = nperseg // 2 + 1
 
-    # Prepare memmap to hold dB values (float32). This keeps RAM usage low.
-    tmp_dir = os.path.dirname(os.path.abspath(output)) or "."
-    tmp_memmap_path = os.path.join(
-        tmp_dir,
-        f".{os.path.basename(output)}.spectrogram.memmap"
-    )
+    # Hold dB values (float32) in RAM when they comfortably fit; otherwise use a
+    # disk-backed memmap to keep RAM usage low on long segments.
+    tmp_memmap_path = None
+    spec_shape = (n_freq, max(n_time, 1))
+    if n_freq * spec_shape[1] * 4 < _IN_MEMORY_MAX_BYTES:
+        spec_db = np.empty(spec_shape, dtype=np.float32)
+    else:
+        tmp_dir = os.path.dirname(os.path.abspath(output)) or "."
+        tmp_memmap_path = os.path.join(
+            tmp_dir,
+            f".{os.path.basename(output)}.spectrogram.memmap"
+        )
+
+        # Clean any stale memmap
+        try:
+            if os.path.exists(tmp_memmap_path):
+                os.remove(tmp_memmap_path)
+        except OSError:
+            pass
+
+        spec_db = np.memmap(tmp_memmap_path, mode="w+", dtype=np.float32, shape=spec_shape)
 
-    # Clean any stale memmap
-    try:
-        if os.path.exists(tmp_memmap_path):
-            os.remove(tmp_memmap_path)
-    except OSError:
-        pass
+    # Stream through the audio. The block length is nperseg plus a whole number
+    # of hops, so every full block is consumed exactly and the next block
+    # (rewound by noverlap) starts on the next frame boundary.
+    frames_per_block = nperseg + max(0, int(block_seconds * samplerate) - nperseg) // hop * hop
 
-    spec_mm = np.memmap(tmp_memmap_path, mode="w+", dtype=np.float32, shape=(n_freq, max(n_time, 1)))
+    # Window (cached per nperseg) and frame buffer are reused for every block
+    window = _hann_window(nperseg)
+    max_frames = 1 + (frames_per_block - nperseg) // hop
+    frames_buf = np.empty((max_frames, nperseg), dtype=np.float32)
 
-    # Stream through the audio
-    frames_per_block = max(int(block_seconds * samplerate), nperseg)
+    # soundfile reads every block (including the overlap) into this buffer
+    block_buf = np.empty((frames_per_block, channels), dtype=np.float32)
     frame_cursor = 0
-    carry = np.zeros(0, dtype=np.float32)
+    frames_left = segment_frames
+    carried = 0  # overlap samples soundfile copies to the front of each later block
 
-    with sf.SoundFile(filename, mode="r") as snd:
+    # Let scipy.fft spread each batched rfft across all cores
+    with sf.SoundFile(filename, mode="r") as snd, set_workers(os.cpu_count() or 1):
         snd.seek(start_frame)
-        frames_read = 0
-        while frames_read < segment_frames:
-            to_read = min(frames_per_block, segment_frames - frames_read)
-            # Read a block (always_2d to handle multi-channel uniformly)
-            block = snd.read(frames=to_read, dtype="float32", always_2d=True)
-            if block.size == 0:
-                break
-            frames_read += block.shape[0]
+        for block in snd.blocks(overlap=noverlap, frames=segment_frames, out=block_buf):
+            # soundfile may hand back more rows than it filled (the first short
+            # block includes noverlap unread rows), so clip to what was read
+            n_read = min(frames_per_block - carried, frames_left)
+            frames_left -= n_read
             # Mixdown to mono by taking first channel
-            x = block[:, 0]
-
-            # Prepend carry from previous block to ensure correct overlap continuity
-            if carry.size > 0:
-                x = np.concatenate([carry, x])
-
-            # How many full frames can we form from this buffer?
-            if x.size >= nperseg:
-                n_frames = 1 + (x.size - nperseg) // hop
-                used_len = nperseg + (n_frames - 1) * hop
-            else:
-                n_frames = 0
-                used_len = 0
-
-            if n_frames > 0:
-                f, t_chunk, Sxx = _compute_spectrogram_chunk(x[:used_len], samplerate, nperseg, noverlap)
-                # Convert to dB
-                Sxx = np.maximum(Sxx.astype(np.float32, copy=False), 1e-12)
-                Sxx_db = 20.0 * np.log10(Sxx)
-
-                # Write into memmap; handle potential slight mismatch at the tail
-                end_cursor = min(frame_cursor + Sxx_db.shape[1], spec_mm.shape[1])
-                spec_mm[:, frame_cursor:end_cursor] = Sxx_db[:, : end_cursor - frame_cursor]
-                frame_cursor = end_cursor
-
-                # Keep last noverlap samples for next block continuity
-                carry = x[used_len - noverlap:used_len].copy()
-            else:
-                # Not enough samples to form a frame yet; accumulate in carry
-                carry = x.copy()
+            x = block[: carried + n_read, 0]
+            carried = noverlap
+            if x.size < nperseg:
+                break
+            n_frames = 1 + (x.size - nperseg) // hop
+            used_len = nperseg + (n_frames - 1) * hop
+
+            spec = _compute_spectrogram_chunk(x[:used_len], frames_buf, window, hop)
+
+            # Convert to dB directly into the output array; handle potential slight mismatch at the tail
+            end_cursor = min(frame_cursor + spec.shape[0], spec_db.shape[1])
+            _cplx_to_db(spec.real, spec.imag, spec_db[:, frame_cursor:end_cursor], 1e-24)
+            frame_cursor = end_cursor
 
             # Safety: break if we've filled expected frames
-            if frame_cursor >= spec_mm.shape[1]:
+            if frame_cursor >= spec_db.shape[1]:
                 break
 
-    # Determine frequency index limit for max_freq
-    f_bins = np.fft.rfftfreq(nperseg, d=1.0 / samplerate)
+    # Determine frequency index limit for max_freq. rfft bins are evenly spaced
+    # (k * samplerate / nperseg), so bins <= max_freq are simply the first k_max.
     max_freq = float(max_freq)
-    f_mask = f_bins <= max_freq
-    f_bins = f_bins[f_mask]
-
-    # Dynamic color scaling for better contrast in weak signals
-    img_view = spec_mm[:, :frame_cursor]
-    finite_mask = np.isfinite(img_view)
-    if np.any(finite_mask):
+    k_max = min(n_freq, max(0, int(np.floor(max_freq * nperseg / samplerate)) + 1))
+    f_top = (k_max - 1) * samplerate / nperseg if k_max else max_freq
+
+    # Dynamic color scaling for better contrast in weak signals. Percentiles are
+    # estimated from a strided subsample of ~2000 time columns, which avoids
+    # copying every finite value of a long recording.
+    img_view = spec_db[:, :frame_cursor]
+    sample = img_view[:, ::max(1, img_view.shape[1] // 2000)].ravel()
+    sample = sample[np.isfinite(sample)]
+    if sample.size:
         if db_range is not None:
-            vmax = float(np.nanpercentile(img_view[finite_mask], phigh))
+            vmax = float(np.percentile(sample, phigh))
             vmin = vmax - float(db_range)
         else:
-            vmin = float(np.nanpercentile(img_view[finite_mask], plow))
-            vmax = float(np.nanpercentile(img_view[finite_mask], phigh))
-        if not np.isfinite(vmin):
-            vmin = float(np.nanmin(img_view))
-        if not np.isfinite(vmax):
-            vmax = float(np.nanmax(img_view))
+            vmin, vmax = (float(v) for v in np.percentile(sample, [plow, phigh]))
         if vmin >= vmax:
             vmax = vmin + 1.0
     else:
         vmin, vmax = -120.0, 0.0
 
     duration_sec_plotted = segment_frames / float(samplerate)
-
-    # Plot using imshow to avoid generating a giant quadmesh in memory
-    plt.figure(figsize=(10, 5))
-    extent = [start_sec, start_sec + duration_sec_plotted, f_bins[0] if f_bins.size else 0.0, f_bins[-1] if f_bins.size else max_freq]
-    # Slice to selected frequency range and produced frames only
-    img_data = spec_mm[f_mask, :frame_cursor]
-    plt.imshow(
-        img_data,
-        origin="lower",
-        aspect="auto",
-        extent=extent,
-        interpolation="nearest",
-        cmap=colormap,
-        vmin=vmin,
-        vmax=vmax,
-    )
-    plt.ylabel("Frequency [Hz]")
-    plt.xlabel("Time [s]")
-    plt.ylim([0, max_freq])
-    cbar = plt.colorbar()
-    cbar.set_label("Magnitude [dB]")
-    plt.title("Spectrogram")
-    plt.tight_layout()
-    plt.savefig(output, dpi=150)
-    plt.close()
+    extent = [start_sec, start_sec + duration_sec_plotted, 0.0, f_top]
+    # Slice to selected frequency range and produced frames only (a view, no copy)
+    img_data = spec_db[:k_max, :frame_cursor]
+    # Max-pool along time down to about the output pixel width, so short sferic
+    # spikes survive instead of being skipped by render-time resampling
+    stride = max(1, img_data.shape[1] // int(_FIGSIZE[0] * _DPI))
+    if stride > 1:
+        n_cols = img_data.shape[1] // stride
+        img_data = img_data[:, : stride * n_cols].reshape(img_data.shape[0], n_cols, stride).max(axis=2)
+
+    # Render to a temporary file and rename it into place, so a power cut never
+    # leaves a truncated image; the format comes from the real output name
+    tmp_output = output + ".tmp"
+    fmt = os.path.splitext(output)[1][1:].lower() or "png"
+    if axes:
+        _plot_figure(img_data, tmp_output, fmt, extent, max_freq, colormap, vmin, vmax)
+    else:
+        _save_image(img_data, tmp_output, fmt, colormap, vmin, vmax)
+    os.replace(tmp_output, output)
 
     # Clean up memmap file
-    try:
-        del spec_mm  # ensure file is closed on Windows
-    except Exception:
-        pass
-    try:
-        if os.path.exists(tmp_memmap_path):
-            os.remove(tmp_memmap_path)
-    except OSError:
-        pass
+    if tmp_memmap_path is not None:
+        try:
+            del spec_db  # ensure file is closed on Windows
+        except Exception:
+            pass
+        try:
+            if os.path.exists(tmp_memmap_path):
+                os.remove(tmp_memmap_path)
+        except OSError:
+            pass
 
     print(f"Spectrogram saved to {output}")
 
@@ -230,6 +315,7 @@ if __name__ == "__main__":
     parser.add_argument("--phigh", type=float, default=SPEC_PHIGH, help="Upper percentile for auto scaling")
     parser.add_argument("--db_range", type=float, default=SPEC_DB_RANGE, help="If set, use fixed dB range (vmin=vmax-dB)")
     parser.add_argument("--colormap", default=SPEC_COLORMAP, help="Matplotlib colormap (e.g., inferno, viridis)")
+    parser.add_argument("--no_axes", dest="axes", action="store_false", help="Write only the image (no axes/colorbar) via Pillow")
     # Time cropping
     parser.add_argument("--start_sec", type=float, default=None, help="Start time (s) from beginning of file")
     parser.add_argument("--duration_sec", type=float, default=None, help="Duration (s) to process from start_sec")
@@ -251,4 +337,5 @@ if __name__ == "__main__":
         start_sec=args.start_sec,
         duration_sec=args.duration_sec,
         last_minutes=args.last_minutes,
+        axes=args.axes,
     )